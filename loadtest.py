@@ -0,0 +1,56 @@
+# load test for the spellscript server
+# start a server first: python spellscript.py --serve --port=7777
+# then run: python loadtest.py your-spell.spell --requests=1000 --concurrency=16 --address=127.0.0.1:7777
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from spellscript import DEFAULT_SERVE_PORT, cast_remote, parse_address
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = {}
+    for option in sys.argv[1:]:
+        if option.startswith("--"):
+            name, _, value = option[2:].partition("=")
+            options[name] = value
+    if not args:
+        print("usage: python loadtest.py <filename>.spell [--requests=<n>] [--concurrency=<n>] [--address=<address>]")
+        sys.exit(1)
+
+    with open(args[0], 'r') as f:
+        text = f.read()
+    requests = int(options.get("requests") or 200)
+    concurrency = int(options.get("concurrency") or 8)
+    address = parse_address(options.get("address") or f"127.0.0.1:{DEFAULT_SERVE_PORT}")
+    spell_dir = os.path.dirname(os.path.abspath(args[0]))
+
+    def one_request(_):
+        start = time.perf_counter()
+        result = cast_remote(text, address=address, spell_dir=spell_dir)
+        return time.perf_counter() - start, result["status"]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one_request, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, status in results if status != 2)
+    refused = sum(1 for _, status in results if status == 2)
+    backfired = sum(1 for _, status in results if status == 1)
+    print(f"requests: {requests} ({concurrency} at a time) in {wall:.2f}s")
+    print(f"throughput: {requests / wall:.1f} spells/s")
+    print(f"backfired: {backfired}, refused (server busy or timed out): {refused}")
+    for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        print(f"{label}: {percentile(latencies, fraction) * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
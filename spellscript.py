@@ -1,16 +1,184 @@
 # spellscript interpreter
 # open sourced and documented at: https://github.com/sirbread/spellscript
 
+import bisect
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import queue
 import re
+import signal
+import socket
+import socketserver
 import sys
+import threading
 import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+PARALLEL_MIN_ITEMS = 2048
+COMPILED_SPELL_LIMIT = 256
+DEFAULT_SERVE_PORT = 7777
+DEFAULT_SPELL_TIMEOUT = 30
+
+compiled_spells = {}
+
+ARITHMETIC_OPERATORS = ("multiplied by", "divided by", "greater by", "lesser by")
+OPERATOR_SPLITTERS = {op: re.compile(r'\s+' + op + r'\s+', re.IGNORECASE) for op in ARITHMETIC_OPERATORS}
+# inline bodies mentioning any of these are left to evaluate_expression
+NOT_COMPILABLE = re.compile(r'tome|collection holding|bound with|at position|length of|portion of|sorted|'
+                            r'position of|divine|ritual|truth|falsehood|whispers')
+
+def apply_operator(op, a, b):
+    if not isinstance(a, (int, float)):
+        raise TypeError(f"Expected number, got {type(a).__name__}: {a}")
+    if not isinstance(b, (int, float)):
+        # lesser by has always reported the left operand's type here
+        raise TypeError(f"Expected number, got {type(a if op == 'lesser by' else b).__name__}: {b}")
+    if op == "multiplied by":
+        return a * b
+    if op == "divided by":
+        if b == 0:
+            raise ZeroDivisionError("Cannot divide by zero")
+        result = a / b
+        if isinstance(a, int) and isinstance(b, int) and result.is_integer():
+            return int(result)
+        return result
+    if op == "greater by":
+        return a + b
+    return a - b
+
+def new_counters():
+    return {
+        "statements": 0,
+        "expressions": 0,
+        "ritual_calls": {},
+        "inlined_calls": 0,
+        "loop_iterations": 0,
+        "collections_allocated": 0,
+        "views_created": 0,
+        "collection_appends": 0,
+        "peak_context_depth": 0,
+        "bytes_inscribed": 0,
+    }
 
 class ExecutionContext:
+    __slots__ = ('source', 'body_statements', 'current_index')
+
     def __init__(self, source='main', body_statements=None, start_index=0):
         self.source = source
         self.body_statements = body_statements or []
         self.current_index = start_index
 
+class CollectionView:
+    __slots__ = ('source', 'start', 'stop')
+
+    def __init__(self, source, start, stop):
+        self.source = source
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            begin, end, step = index.indices(len(self))
+            return self.source[self.start + begin:self.start + end:step]
+        return self.source[self.start + index]
+
+    def __iter__(self):
+        return map(self.source.__getitem__, range(self.start, self.stop))
+
+    def __contains__(self, value):
+        return any(item == value for item in self)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, CollectionView)):
+            return self.to_list() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __str__(self):
+        return str(self.to_list())
+
+    def to_list(self):
+        return self.source[self.start:self.stop]
+
+class MemoryTracker:
+    def __init__(self):
+        self.frames = []
+        self.peaks = {}
+        self.variable_peaks = {}
+        self.signatures = {}
+
+    def start(self):
+        tracemalloc.start()
+        self.enter("whole spell")
+
+    def finish(self):
+        while self.frames:
+            self.exit()
+        tracemalloc.stop()
+
+    # each frame is [label, memory in use when it was entered, highest peak seen inside it]
+    def enter(self, label):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.frames and peak > self.frames[-1][2]:
+            self.frames[-1][2] = peak
+        tracemalloc.reset_peak()
+        self.frames.append([label, current, current])
+
+    def exit(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        label, baseline, frame_peak = self.frames.pop()
+        frame_peak = max(frame_peak, peak)
+        growth = frame_peak - baseline
+        if label not in self.peaks or growth > self.peaks[label][0]:
+            self.peaks[label] = (growth, frame_peak)
+        if self.frames and frame_peak > self.frames[-1][2]:
+            self.frames[-1][2] = frame_peak
+        tracemalloc.reset_peak()
+
+    # with a statement, only variables it names or whose identity or length changed are sized again
+    def sample_variables(self, variables, statement=None):
+        tracing = tracemalloc.is_tracing()
+        if tracing and self.frames:
+            self.frames[-1][2] = max(self.frames[-1][2], tracemalloc.get_traced_memory()[1])
+        words = set(re.findall(r"\w+", statement)) if statement is not None else None
+        for name, value in variables.items():
+            signature = (id(value), len(value) if isinstance(value, (list, dict, CollectionView)) else None)
+            if words is not None and name not in words and self.signatures.get(name) == signature:
+                continue
+            self.signatures[name] = signature
+            size = deep_sizeof(value)
+            if size > self.variable_peaks.get(name, 0):
+                self.variable_peaks[name] = size
+        # the sizing itself should not show up in the peaks
+        if tracing:
+            tracemalloc.reset_peak()
+
+def deep_sizeof(value, seen=None):
+    if seen is None:
+        seen = set()
+    size = 0
+    pending = [value]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, list):
+            pending.extend(item)
+        elif isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+    return size
+
 class SpellScriptInterpreter:
     def __init__(self):
         self.variables = {}
@@ -19,11 +187,75 @@ class SpellScriptInterpreter:
         self.current_token_index = 0
         self.last_return_value = None
         self.context_stack = []
+        self.counters = new_counters()
+        self.libraries = []
+        self.spell_dir = None
+        self.inline_rituals = True
+        self.call_sites = {}
+        self.resolved_calls = {}
+        self.compiled_inlines = {}
+        self.collected_blocks = {}
+        self.loop_headers = {}
+        self.traverse_headers = {}
+        self.spare_contexts = {}
+        self.memory_tracker = None
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["ritual_calls"] = dict(self.counters["ritual_calls"])
+        return stats
+
+    def memory_report(self, top=10):
+        tracker = self.memory_tracker
+        if tracker is None:
+            raise RuntimeError("memory tracking is off, set interp.memory_tracker = MemoryTracker() first")
+        tracker.sample_variables(self.variables)
+        variables = []
+        seen = set()
+        for name, value in self.variables.items():
+            kind = "portion" if isinstance(value, CollectionView) else type(value).__name__
+            variables.append({"name": name, "type": kind, "bytes": deep_sizeof(value, seen),
+                              "peak_bytes": tracker.variable_peaks.get(name, 0)})
+        for name, peak in tracker.variable_peaks.items():
+            if name not in self.variables:
+                variables.append({"name": name, "type": "banished", "bytes": 0, "peak_bytes": peak})
+        variables.sort(key=lambda entry: (entry["peak_bytes"], entry["bytes"]), reverse=True)
+        peaks = sorted(({"where": label, "growth_bytes": growth, "peak_bytes": peak}
+                        for label, (growth, peak) in tracker.peaks.items()),
+                       key=lambda entry: (entry["growth_bytes"], entry["peak_bytes"]), reverse=True)
+        return {
+            "peak_bytes": max((peak for _, peak in tracker.peaks.values()), default=0),
+            "variables": variables[:top],
+            "peaks": peaks[:top],
+        }
+
+    def merge_counters(self, counters):
+        for key, value in counters.items():
+            if key == "ritual_calls":
+                for name, calls in value.items():
+                    self.counters[key][name] = self.counters[key].get(name, 0) + calls
+            elif key == "peak_context_depth":
+                depth = len(self.context_stack) + value
+                if depth > self.counters[key]:
+                    self.counters[key] = depth
+            else:
+                self.counters[key] += value
+
+    def push_context(self, context):
+        self.context_stack.append(context)
+        if len(self.context_stack) > self.counters["peak_context_depth"]:
+            self.counters["peak_context_depth"] = len(self.context_stack)
 
     def tokenize(self, spell_text):
-        pattern = r'((?:[^\.":"]|"[^"]*")+[\.:])'
-        statements = re.findall(pattern, spell_text)
-        return [s.strip() for s in statements if s.strip()]
+        tokens = compiled_spells.get(spell_text)
+        if tokens is None:
+            pattern = r'((?:[^\.":"]|"[^"]*")+[\.:])'
+            statements = re.findall(pattern, spell_text)
+            tokens = tuple(s.strip() for s in statements if s.strip())
+            if len(compiled_spells) >= COMPILED_SPELL_LIMIT:
+                compiled_spells.clear()
+            compiled_spells[spell_text] = tokens
+        return tokens
 
     def parse_and_execute(self, spell_text):
         self.tokens = self.tokenize(spell_text)
@@ -40,7 +272,16 @@ class SpellScriptInterpreter:
         while self.current_token_index < len(self.tokens) - 1:
             statement = self.tokens[self.current_token_index]
             self.current_token_index += 1
-            self.execute_statement(statement)
+            tracker = self.memory_tracker
+            if tracker is None:
+                self.execute_statement(statement)
+                continue
+            tracker.enter(f"statement {self.current_token_index - 1}: {' '.join(statement.split())[:40]}")
+            try:
+                self.execute_statement(statement)
+            finally:
+                tracker.exit()
+                tracker.sample_variables(self.variables, statement)
 
     def remove_filler_words(self, text):
         text = re.sub(r'\bis\b', '', text, flags=re.IGNORECASE)
@@ -48,6 +289,7 @@ class SpellScriptInterpreter:
         return text.strip()
 
     def execute_statement(self, statement):
+        self.counters["statements"] += 1
         statement = statement.strip()
         if statement.endswith('.') or statement.endswith(':'):
             statement = statement[:-1]
@@ -74,16 +316,20 @@ class SpellScriptInterpreter:
             self.handle_inquire(statement)
         elif cmd == "append":
             self.handle_append(statement)
+        elif cmd == "sort":
+            self.handle_sort(statement)
         elif cmd == "ponder":
             self.handle_ponder(words)
         elif cmd == "banish":
-            self.handle_banish(words)
+            self.handle_banish(statement)
         elif cmd == "gaze":
             self.handle_gaze(words)
         elif cmd == "transmute":
             self.handle_transmute(statement)
         elif cmd == "conjure":
             self.handle_conjure(statement)
+        elif cmd == "consult":
+            self.handle_consult(statement)
         elif cmd == "invoke":
             return self.handle_invoke(statement)
         elif cmd == "return":
@@ -119,7 +365,18 @@ class SpellScriptInterpreter:
                 raise NameError(f"unknown entity {array_name}")
             
             array = self.variables[array_name]
-            if not isinstance(array, list):
+            if isinstance(array, dict):
+                key = self.evaluate_expression(index_expr)
+                value = self.evaluate_expression(value_expr)
+                try:
+                    array[key] = value
+                except TypeError:
+                    raise TypeError("tome keys must be numbers, text or truths")
+                return
+            if isinstance(array, CollectionView):
+                array = array.to_list()
+                self.variables[array_name] = array
+            elif not isinstance(array, list):
                 raise TypeError(f"{array_name} is not a collection")
             
             index = self.evaluate_expression(index_expr)
@@ -179,11 +436,46 @@ class SpellScriptInterpreter:
             raise NameError(f"unknown entity {array_name}")
         
         array = self.variables[array_name]
-        if not isinstance(array, list):
+        if isinstance(array, dict):
+            raise TypeError(f"{array_name} is a tome, use Enchant {array_name} at position <key> with <value>")
+        if isinstance(array, CollectionView):
+            array = array.to_list()
+            self.variables[array_name] = array
+        elif not isinstance(array, list):
             raise TypeError(f"{array_name} is not a collection")
         
         value = self.evaluate_expression(value_expr)
         array.append(value)
+        self.counters["collection_appends"] += 1
+
+    def handle_sort(self, statement):
+        match = re.match(r'Sort\s+(\w+)(?:\s+by ritual\s+(\w+))?$', statement, re.IGNORECASE)
+        if not match:
+            raise SyntaxError("use Sort <array> [by ritual <name>]")
+        array_name, ritual_name = match.groups()
+
+        if array_name not in self.variables:
+            raise NameError(f"unknown entity {array_name}")
+
+        array = self.variables[array_name]
+        if isinstance(array, CollectionView):
+            array = array.to_list()
+            self.variables[array_name] = array
+        elif not isinstance(array, list):
+            raise TypeError(f"{array_name} is not a collection")
+
+        self.sort_values(array, array_name, ritual_name)
+
+    def sort_values(self, values, name, ritual_name=None):
+        key = None
+        if ritual_name:
+            if self.lookup_ritual(ritual_name) is None:
+                raise NameError(f"ritual {ritual_name} not found")
+            key = lambda value: self.call_ritual(ritual_name, [value], [None])
+        try:
+            values.sort(key=key)
+        except TypeError as e:
+            raise TypeError(f"cannot sort {name}: {e}")
 
     def collect_block_from_context(self, end_keyword):
         body_statements = []
@@ -200,6 +492,12 @@ class SpellScriptInterpreter:
         
         if self.context_stack:
             context = self.context_stack[-1]
+            # a nested block is collected once per position in its parent body, not once per outer iteration
+            key = (id(context.body_statements), context.current_index, end_keyword)
+            cached = self.collected_blocks.get(key)
+            if cached is not None and cached[0] is context.body_statements:
+                context.current_index = cached[2]
+                return cached[1]
             while context.current_index < len(context.body_statements):
                 token = context.body_statements[context.current_index]
                 context.current_index += 1
@@ -223,6 +521,8 @@ class SpellScriptInterpreter:
                         body_statements.append(token)
                 elif token:
                     body_statements.append(token)
+            body_statements = tuple(body_statements)
+            self.collected_blocks[key] = (context.body_statements, body_statements, context.current_index)
         else:
             while self.current_token_index < len(self.tokens) - 1:
                 token = self.tokens[self.current_token_index]
@@ -251,30 +551,19 @@ class SpellScriptInterpreter:
         return body_statements
 
     def handle_traverse(self, statement):
-        pattern_with_index = r'Traverse\s+(\w+)\s+with each\s+(\w+)\s+at\s+(\w+)\s+to begin'
-        pattern_simple = r'Traverse\s+(\w+)\s+with each\s+(\w+)\s+to begin'
-
-        match_with_index = re.match(pattern_with_index, statement, re.IGNORECASE)
-        match_simple = re.match(pattern_simple, statement, re.IGNORECASE)
-
-        if match_with_index:
-            array_name = match_with_index.group(1)
-            item_var = match_with_index.group(2)
-            index_var = match_with_index.group(3)
-            has_index = True
-        elif match_simple:
-            array_name = match_simple.group(1)
-            item_var = match_simple.group(2)
-            index_var = None
-            has_index = False
-        else:
-            raise SyntaxError("use Traverse <array> with each <item> to begin: ... end traverse")
+        header = self.traverse_headers.get(statement)
+        if header is None:
+            header = self.parse_traverse_header(statement)
+            self.traverse_headers[statement] = header
+        array_name, parallel, item_var, index_var, has_index = header
 
         if array_name not in self.variables:
             raise NameError(f"unknown entity {array_name}")
 
         array = self.variables[array_name]
-        if not isinstance(array, list):
+        if isinstance(array, dict):
+            array = list(array)
+        elif not isinstance(array, (list, CollectionView)):
             raise TypeError(f"{array_name} is not a collection")
 
         body_statements = self.collect_block_from_context("end traverse")
@@ -285,23 +574,24 @@ class SpellScriptInterpreter:
         saved_item = self.variables.get(item_var)
         saved_index = self.variables.get(index_var) if has_index else None
 
-        for idx, item in enumerate(array):
-            self.variables[item_var] = item
-            if has_index:
-                self.variables[index_var] = idx
-
-            context = ExecutionContext(source='body', body_statements=body_statements, start_index=0)
-            self.context_stack.append(context)
-
-            while context.current_index < len(context.body_statements):
-                body_statement = context.body_statements[context.current_index]
-                context.current_index += 1
-                result = self.execute_statement(body_statement)
-                if result is not None:
-                    self.context_stack.pop()
-                    return result
-
-            self.context_stack.pop()
+        if parallel:
+            self.run_parallel_traverse(array_name, array, body_statements, item_var, index_var)
+        else:
+            context = self.take_context(body_statements)
+            iterations = 0
+            try:
+                for idx, item in enumerate(array):
+                    iterations += 1
+                    self.variables[item_var] = item
+                    if has_index:
+                        self.variables[index_var] = idx
+
+                    result = self.run_body(context)
+                    if result is not None:
+                        return result
+            finally:
+                self.counters["loop_iterations"] += iterations
+                self.release_context(context)
 
         if saved_item is not None:
             self.variables[item_var] = saved_item
@@ -314,6 +604,233 @@ class SpellScriptInterpreter:
             elif index_var in self.variables:
                 del self.variables[index_var]
 
+    def parse_traverse_header(self, statement):
+        pattern_with_index = r'Traverse\s+(\w+)\s+(in parallel\s+)?with each\s+(\w+)\s+at\s+(\w+)\s+to begin'
+        pattern_simple = r'Traverse\s+(\w+)\s+(in parallel\s+)?with each\s+(\w+)\s+to begin'
+
+        match_with_index = re.match(pattern_with_index, statement, re.IGNORECASE)
+        match_simple = re.match(pattern_simple, statement, re.IGNORECASE)
+
+        if match_with_index:
+            array_name = match_with_index.group(1)
+            parallel = match_with_index.group(2) is not None
+            item_var = match_with_index.group(3)
+            index_var = match_with_index.group(4)
+            has_index = True
+        elif match_simple:
+            array_name = match_simple.group(1)
+            parallel = match_simple.group(2) is not None
+            item_var = match_simple.group(3)
+            index_var = None
+            has_index = False
+        else:
+            raise SyntaxError("use Traverse <array> [in parallel] with each <item> to begin: ... end traverse")
+        return array_name, parallel, item_var, index_var, has_index
+
+    def run_parallel_traverse(self, array_name, array, body_statements, item_var, index_var):
+        loop_vars = {item_var}
+        if index_var:
+            loop_vars.add(index_var)
+        local_names = set()
+        result_names = set()
+        seen_rituals = set()
+        hazard = self.find_parallel_hazard(body_statements, loop_vars, local_names, result_names, seen_rituals)
+        if hazard is None:
+            for name in sorted(local_names):
+                if name in self.variables:
+                    hazard = f"{name} already exists outside the traverse, so elements would share it"
+                    break
+        if hazard is None:
+            name = self.find_read_before_summon(body_statements, local_names, set(loop_vars))
+            for ritual in sorted(seen_rituals):
+                if name is not None:
+                    break
+                func = self.functions[ritual]
+                name = self.find_read_before_summon(func["body"], local_names, set(func["params"]))
+            if name is not None:
+                hazard = f"{name} may be read before it is summoned for the current element"
+        if hazard is None:
+            scanned = list(body_statements)
+            for ritual in seen_rituals:
+                scanned.extend(self.functions[ritual]["body"])
+            for name in result_names:
+                target = self.variables[name]
+                if name == array_name or any(
+                        other is target or (isinstance(other, CollectionView) and other.source is target)
+                        for key, other in self.variables.items() if key != name):
+                    hazard = f"result collection {name} is shared with another entity"
+                    break
+                appends = rf'append\s+.+?\s+to\s+{re.escape(name)}\b'
+                if any(re.search(rf'\b{re.escape(name)}\b', re.sub(appends, '', s, flags=re.IGNORECASE)) for s in scanned):
+                    hazard = f"result collection {name} is read inside the traverse body"
+                    break
+        if hazard is not None:
+            raise SyntaxError(f"parallel traverse body must be free of side effects: {hazard}")
+
+        workers = os.cpu_count() or 1
+        snapshot = {k: v for k, v in self.variables.items() if k not in result_names}
+        if workers < 2 or len(array) < PARALLEL_MIN_ITEMS or multiprocessing.current_process().daemon:
+            worker = make_traverse_worker(snapshot, self.functions, body_statements, item_var,
+                                          index_var, local_names, result_names)
+            chunk_results = [run_worker_chunk(worker, (0, list(array)))]
+        else:
+            chunk_size = -(-len(array) // (workers * 4))
+            chunks = [(start, array[start:start + chunk_size]) for start in range(0, len(array), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_parallel_worker,
+                                     initargs=(snapshot, self.functions, body_statements, item_var,
+                                               index_var, local_names, result_names)) as pool:
+                chunk_results = list(pool.map(run_parallel_chunk, chunks))
+
+        for element_results, error, counters in chunk_results:
+            if counters is not None:
+                self.merge_counters(counters)
+            for appended, written in element_results:
+                for name, values in appended.items():
+                    self.variables[name].extend(values)
+                self.variables.update(written)
+            if error is not None:
+                raise error
+
+    def find_parallel_hazard(self, statements, loop_vars, local_names, result_names, seen_rituals, in_ritual=False):
+        for statement in statements:
+            statement = statement.strip()
+            if statement.endswith('.') or statement.endswith(':'):
+                statement = statement[:-1].strip()
+            lower = statement.lower()
+            if not lower or lower in ("end loop", "end traverse"):
+                continue
+
+            if "if the signs show" in lower:
+                then_pos = lower.find("then")
+                if then_pos == -1:
+                    return "conditional must include then"
+                otherwise_pos = lower.find(" otherwise ")
+                hazard = self.find_expression_hazard(statement[:then_pos], loop_vars, local_names, result_names, seen_rituals)
+                if hazard is None and otherwise_pos != -1:
+                    actions = [statement[then_pos + len("then"):otherwise_pos], statement[otherwise_pos + len(" otherwise "):]]
+                else:
+                    actions = [statement[then_pos + len("then"):]]
+                hazard = hazard or self.find_parallel_hazard(actions, loop_vars, local_names, result_names, seen_rituals, in_ritual)
+                if hazard is not None:
+                    return hazard
+                continue
+
+            if "repeat the incantation" in lower:
+                if "to begin" not in lower and "do" in lower:
+                    do_pos = lower.find("do") + 2
+                    hazard = self.find_parallel_hazard(re.split(r'\.\s+', statement[do_pos:]), loop_vars, local_names,
+                                                       result_names, seen_rituals, in_ritual)
+                    if hazard is not None:
+                        return hazard
+                continue
+
+            if lower.startswith("traverse "):
+                if "in parallel" in lower:
+                    return "parallel traverses cannot be nested"
+                match = re.match(r'Traverse\s+(\w+)\s+(?:in parallel\s+)?with each\s+(\w+)(?:\s+at\s+(\w+))?', statement, re.IGNORECASE)
+                if match:
+                    local_names.update(n for n in match.groups()[1:] if n)
+                continue
+
+            cmd = lower.split()[0]
+            if cmd == "summon":
+                parts = statement.split()
+                if len(parts) >= 3:
+                    local_names.add(parts[2])
+                if "with essence of" in statement:
+                    expr = statement[statement.find("with essence of") + len("with essence of"):]
+                    hazard = self.find_expression_hazard(expr, loop_vars, local_names, result_names, seen_rituals)
+                    if hazard is not None:
+                        return hazard
+            elif cmd == "enchant":
+                if " at position " in lower:
+                    return f"'{statement}' modifies a collection in place"
+                parts = statement.split(maxsplit=2)
+                if len(parts) < 3:
+                    return f"'{statement}' is not a valid enchantment"
+                if parts[1] not in local_names and (in_ritual or parts[1] not in loop_vars):
+                    return f"'{statement}' modifies {parts[1]}, which outlives a single element"
+                hazard = self.find_expression_hazard(parts[2], loop_vars, local_names, result_names, seen_rituals)
+                if hazard is not None:
+                    return hazard
+            elif cmd == "transmute":
+                parts = re.split(r'\s+into\s+', statement, flags=re.IGNORECASE, maxsplit=1)
+                name = parts[0][len("transmute "):].strip()
+                if name not in local_names and (in_ritual or name not in loop_vars):
+                    return f"'{statement}' modifies {name}, which outlives a single element"
+            elif cmd == "append" and not in_ritual:
+                match = re.match(r'Append\s+(.+?)\s+to\s+(\w+)$', statement, re.IGNORECASE)
+                if not match:
+                    return f"'{statement}' is not a valid append"
+                target = match.group(2)
+                if target in local_names or target in loop_vars or not isinstance(self.variables.get(target), list):
+                    return f"'{statement}' must append to a collection summoned before the traverse"
+                result_names.add(target)
+                hazard = self.find_expression_hazard(match.group(1), loop_vars, local_names, result_names, seen_rituals)
+                if hazard is not None:
+                    return hazard
+            elif cmd == "return" and in_ritual:
+                hazard = self.find_expression_hazard(statement[len("return"):], loop_vars, local_names, result_names, seen_rituals)
+                if hazard is not None:
+                    return hazard
+            else:
+                return f"'{statement}' has side effects"
+        return None
+
+    def find_read_before_summon(self, statements, local_names, assigned):
+        scopes = [set(assigned)]
+        for statement in statements:
+            statement = statement.strip()
+            if statement.endswith('.') or statement.endswith(':'):
+                statement = statement[:-1].strip()
+            lower = statement.lower()
+            if lower in ("end loop", "end traverse"):
+                if len(scopes) > 1:
+                    scopes.pop()
+                continue
+
+            words = set(re.findall(r'\w+', statement)) & local_names
+            if lower.startswith("summon "):
+                parts = statement.split()
+                target = parts[2] if len(parts) >= 3 else None
+                if "with essence of" in statement:
+                    expr = statement[statement.find("with essence of") + len("with essence of"):]
+                    words = set(re.findall(r'\w+', expr)) & local_names
+                else:
+                    words = set()
+            elif lower.startswith("traverse "):
+                match = re.match(r'Traverse\s+(\w+)\s+(?:in parallel\s+)?with each\s+(\w+)(?:\s+at\s+(\w+))?', statement, re.IGNORECASE)
+                target = None
+                words = {match.group(1)} & local_names if match else words
+            else:
+                target = None
+
+            unassigned = words - scopes[-1]
+            if unassigned:
+                return sorted(unassigned)[0]
+
+            opens_block = "to begin" in lower and (lower.startswith("traverse ") or "repeat the incantation" in lower)
+            if opens_block:
+                scopes.append(set(scopes[-1]))
+                if lower.startswith("traverse ") and match:
+                    scopes[-1].update(n for n in match.groups()[1:] if n)
+            if target is not None:
+                scopes[-1].add(target)
+        return None
+
+    def find_expression_hazard(self, expr, loop_vars, local_names, result_names, seen_rituals):
+        for name in re.findall(r'(?:through ritual|invoke the ritual|by ritual)\s+(\w+)', expr, re.IGNORECASE):
+            if name in seen_rituals:
+                continue
+            seen_rituals.add(name)
+            func = self.lookup_ritual(name)
+            if func is None:
+                return f"ritual {name} not found"
+            hazard = self.find_parallel_hazard(func["body"], loop_vars, local_names, result_names, seen_rituals, in_ritual=True)
+            if hazard is not None:
+                return f"ritual {name}: {hazard}"
+        return None
+
     def split_collection_items(self, items_str):
         items = []
         current_tokens = []
@@ -347,22 +864,39 @@ class SpellScriptInterpreter:
         return items
 
     def evaluate_ritual_call(self, ritual_call):
+        call_site = self.call_sites.get(ritual_call)
+        if call_site is None:
+            call_site = self.parse_ritual_call(ritual_call)
+            self.call_sites[ritual_call] = call_site
+
+        return self.call_resolved(*call_site)
+
+    def parse_ritual_call(self, ritual_call):
         pattern = r'(\w+)(?: with (.+))?'
         match = re.match(pattern, ritual_call, re.IGNORECASE)
         if not match:
             raise SyntaxError("invalid ritual call syntax")
-
-        name = match.group(1)
         args_str = match.group(2)
+        args_raw = [a.strip() for a in args_str.split("and")] if args_str else None
+        return (match.group(1), args_raw)
 
-        if name not in self.functions:
+    def call_resolved(self, name, args_raw):
+        func = self.lookup_ritual(name)
+        if func is None:
             raise NameError(f"ritual {name} not found")
 
-        func = self.functions[name]
-        params = func["params"]
-
-        if args_str:
-            args_raw = [a.strip() for a in args_str.split("and")]
+        if "inline" in func and self.inline_rituals and self.memory_tracker is None:
+            compiled = self.compiled_inlines.get(name)
+            if compiled is None or compiled[0] is not func:
+                compiled = (func, self.compile_inline(func["inline"], func["params"]))
+                self.compiled_inlines[name] = compiled
+            if compiled[1] is not None:
+                variables = self.variables
+                args = [variables[arg] if arg in variables else self.evaluate_expression(arg)
+                        for arg in args_raw or ()]
+                return self.run_compiled_inline(name, func, compiled[1], args)
+
+        if args_raw:
             args = []
             arg_var_names = []
 
@@ -377,9 +911,69 @@ class SpellScriptInterpreter:
             args = []
             arg_var_names = []
 
+        return self.call_ritual(name, args, arg_var_names)
+
+    # compiles an inline arithmetic body into a function of the argument list,
+    # splitting on the operators in the same order evaluate_expression does
+    def compile_inline(self, expr, params):
+        if NOT_COMPILABLE.search(expr.lower()):
+            return None
+        return self.compile_inline_node(expr, {p: i for i, p in enumerate(params)})
+
+    def compile_inline_node(self, expr, positions):
+        expr = expr.strip()
+        lower = expr.lower()
+        for op in ARITHMETIC_OPERATORS:
+            if op in lower:
+                parts = OPERATOR_SPLITTERS[op].split(expr, maxsplit=1)
+                if len(parts) == 2:
+                    left = self.compile_inline_node(parts[0], positions)
+                    right = self.compile_inline_node(parts[1], positions)
+                    if left is None or right is None:
+                        return None
+                    (left_fn, left_nodes), (right_fn, right_nodes) = left, right
+                    return (lambda args, variables: apply_operator(op, left_fn(args, variables), right_fn(args, variables)),
+                            left_nodes + right_nodes + 1)
+        if expr in positions:
+            index = positions[expr]
+            return (lambda args, variables: args[index]), 1
+        try:
+            value = self.parse_number(expr)
+        except ValueError:
+            value = expr
+        return (lambda args, variables: variables[expr] if expr in variables else value), 1
+
+    def run_compiled_inline(self, name, func, compiled, args):
+        params = func["params"]
+        if len(args) != len(params):
+            raise ValueError(f"ritual {name} expects {len(params)} args, got {len(args)}")
+        calls = self.counters["ritual_calls"]
+        calls[name] = calls.get(name, 0) + 1
+        self.counters["inlined_calls"] += 1
+        fn, nodes = compiled
+        self.counters["expressions"] += nodes
+        return fn(args, self.variables)
+
+    def call_ritual(self, name, args, arg_var_names):
+        tracker = self.memory_tracker
+        if tracker is None:
+            return self.perform_ritual(name, args, arg_var_names)
+        tracker.enter(f"ritual {name}")
+        try:
+            return self.perform_ritual(name, args, arg_var_names)
+        finally:
+            tracker.exit()
+
+    def perform_ritual(self, name, args, arg_var_names):
+        func = self.functions[name]
+        params = func["params"]
+
         if len(args) != len(params):
             raise ValueError(f"ritual {name} expects {len(params)} args, got {len(args)}")
 
+        calls = self.counters["ritual_calls"]
+        calls[name] = calls.get(name, 0) + 1
+
         saved_param_values = {}
         for p in params:
             if p in self.variables:
@@ -388,8 +982,18 @@ class SpellScriptInterpreter:
         for p, a in zip(params, args):
             self.variables[p] = a
 
-        context = ExecutionContext(source='body', body_statements=func["body"], start_index=0)
-        self.context_stack.append(context)
+        inline = func.get("inline")
+        if inline is not None and self.inline_rituals:
+            self.counters["inlined_calls"] += 1
+            result = self.evaluate_expression(inline)
+            for p in params:
+                if p in saved_param_values:
+                    self.variables[p] = saved_param_values[p]
+                else:
+                    del self.variables[p]
+            return result
+
+        context = self.take_context(func["body"])
         
         result = None
         while context.current_index < len(context.body_statements):
@@ -399,7 +1003,7 @@ class SpellScriptInterpreter:
             if result is not None:
                 break
 
-        self.context_stack.pop()
+        self.release_context(context)
 
         for i, (param, var_name) in enumerate(zip(params, arg_var_names)):
             if var_name is not None and param in self.variables:
@@ -414,20 +1018,27 @@ class SpellScriptInterpreter:
 
         return result
 
+    def inscribe_text(self, text):
+        text = str(text)
+        print(text)
+        self.counters["bytes_inscribed"] += len(text.encode("utf-8")) + 1
+
     def handle_inscribe(self, statement):
         msg = statement[len("inscribe "):].strip()
         if msg.startswith('whispers of "') and msg.endswith('"'):
-            print(msg[len('whispers of "'):-1])
+            self.inscribe_text(msg[len('whispers of "'):-1])
             return
         
         try:
             val = self.evaluate_expression(msg)
-            if isinstance(val, list):
-                print(f"[{', '.join(str(v) for v in val)}]")
+            if isinstance(val, (list, CollectionView)):
+                self.inscribe_text(f"[{', '.join(str(v) for v in val)}]")
+            elif isinstance(val, dict):
+                self.inscribe_text(f"{{{', '.join(f'{k}: {v}' for k, v in val.items())}}}")
             else:
-                print(val)
+                self.inscribe_text(val)
         except:
-            print(msg)
+            self.inscribe_text(msg)
 
     def handle_ponder(self, words):
         if len(words) >= 4 and words[1] == "for" and words[3] == "moments":
@@ -439,9 +1050,25 @@ class SpellScriptInterpreter:
         else:
             raise SyntaxError("use Ponder for <seconds> moments")
 
-    def handle_banish(self, words):
+    def handle_banish(self, statement):
+        match = re.match(r'Banish\s+(.+?)\s+from\s+(\w+)$', statement, re.IGNORECASE)
+        if match:
+            key_expr, tome_name = match.groups()
+            if tome_name not in self.variables:
+                raise NameError(f"unknown entity {tome_name}")
+            tome = self.variables[tome_name]
+            if not isinstance(tome, dict):
+                raise TypeError(f"{tome_name} is not a tome")
+            key = self.evaluate_expression(key_expr)
+            try:
+                del tome[key]
+            except (KeyError, TypeError):
+                raise LookupError(f"key {key} not found in {tome_name}")
+            return
+
+        words = statement.split()
         if len(words) < 3 or words[1].lower() != "the":
-            raise SyntaxError("use Banish the <name>")
+            raise SyntaxError("use Banish the <name> or Banish <key> from <tome>")
         name = words[2]
         if name in self.variables:
             del self.variables[name]
@@ -528,6 +1155,38 @@ class SpellScriptInterpreter:
                 "params": params,
                 "body": [body]
             }
+            inline = self.find_inline_expression(body)
+            if inline is not None:
+                self.functions[name]["inline"] = inline
+
+    def find_inline_expression(self, body):
+        parts = body.split(maxsplit=1)
+        if len(parts) < 2 or parts[0].lower() != "return":
+            return None
+        if re.search(r'through ritual|invoke the ritual|by ritual', parts[1], re.IGNORECASE):
+            return None
+        return parts[1].strip()
+
+    def handle_consult(self, statement):
+        match = re.match(r'Consult the grimoire\s+whispers of\s+"([^"]+)"$', statement, re.IGNORECASE)
+        if not match:
+            raise SyntaxError('use Consult the grimoire whispers of "<path>"')
+        path = match.group(1)
+        if not os.path.isabs(path):
+            path = os.path.join(self.spell_dir or os.getcwd(), path)
+        rituals = load_grimoire(path)
+        if rituals not in self.libraries:
+            self.libraries.append(rituals)
+
+    def lookup_ritual(self, name):
+        func = self.functions.get(name)
+        if func is None:
+            for rituals in self.libraries:
+                if name in rituals:
+                    func = rituals[name]
+                    self.functions[name] = func
+                    break
+        return func
 
     def handle_return(self, statement):
         parts = statement.split(maxsplit=1)
@@ -542,10 +1201,8 @@ class SpellScriptInterpreter:
         if not match:
             raise SyntaxError("use Invoke the ritual <name> with <args>")
         name, args_str = match.groups()
-        if name not in self.functions:
+        if self.lookup_ritual(name) is None:
             raise NameError(f"ritual {name} not found")
-        func = self.functions[name]
-        params = func["params"]
         if args_str:
             args_raw = [a.strip() for a in args_str.split("and")]
             args = []
@@ -562,41 +1219,7 @@ class SpellScriptInterpreter:
             args = []
             arg_var_names = []
             
-        if len(args) != len(params):
-            raise ValueError(f"ritual {name} expects {len(params)} args, got {len(args)}")
-        
-        saved_param_values = {}
-        for p in params:
-            if p in self.variables:
-                saved_param_values[p] = self.variables[p]
-        
-        for p, a in zip(params, args):
-            self.variables[p] = a
-        
-        context = ExecutionContext(source='body', body_statements=func["body"], start_index=0)
-        self.context_stack.append(context)
-        
-        result = None
-        while context.current_index < len(context.body_statements):
-            body_statement = context.body_statements[context.current_index]
-            context.current_index += 1
-            result = self.execute_statement(body_statement)
-            if result is not None:
-                break
-        
-        self.context_stack.pop()
-        
-        for i, (param, var_name) in enumerate(zip(params, arg_var_names)):
-            if var_name is not None and param in self.variables:
-                self.variables[var_name] = self.variables[param]
-        
-        for p in params:
-            if p in saved_param_values:
-                self.variables[p] = saved_param_values[p]
-            else:
-                if p in self.variables:
-                    del self.variables[p]
-        
+        result = self.call_ritual(name, args, arg_var_names)
         self.last_return_value = result
         return result
 
@@ -627,10 +1250,11 @@ class SpellScriptInterpreter:
 
     def handle_loop(self, statement):
         statement = statement.strip()
-        match = re.search(r'repeat the incantation (\w+) times', statement.lower())
-        if not match:
-            raise SyntaxError("use Repeat the incantation <number> to begin <action>")
-        count_str = match.group(1)
+        header = self.loop_headers.get(statement)
+        if header is None:
+            header = self.parse_loop_header(statement)
+            self.loop_headers[statement] = header
+        count_str, body_tokens = header
         try:
             count = int(count_str)
         except ValueError:
@@ -638,6 +1262,29 @@ class SpellScriptInterpreter:
                 count = int(self.variables[count_str])
             else:
                 raise SyntaxError("use Repeat the incantation <number> to begin <action>")
+
+        if not body_tokens:
+            body_tokens = self.collect_block_from_context("end loop")
+        
+        if not body_tokens:
+            raise SyntaxError("loop body is empty")
+        
+        context = self.take_context(body_tokens)
+        iterations = 0
+        try:
+            for _ in range(count):
+                iterations += 1
+                result = self.run_body(context)
+                if result is not None:
+                    return result
+        finally:
+            self.counters["loop_iterations"] += iterations
+            self.release_context(context)
+
+    def parse_loop_header(self, statement):
+        match = re.search(r'repeat the incantation (\w+) times', statement.lower())
+        if not match:
+            raise SyntaxError("use Repeat the incantation <number> to begin <action>")
         body_tokens = []
         if "do" in statement.lower():
             do_pos = statement.lower().find("do") + 2
@@ -650,26 +1297,32 @@ class SpellScriptInterpreter:
                         s = s[:-1].strip()
                     if s:
                         body_tokens.append(s)
-        
-        if not body_tokens:
-            body_tokens = self.collect_block_from_context("end loop")
-        
-        if not body_tokens:
-            raise SyntaxError("loop body is empty")
-        
-        for _ in range(count):
-            context = ExecutionContext(source='body', body_statements=body_tokens, start_index=0)
-            self.context_stack.append(context)
-            
-            while context.current_index < len(context.body_statements):
-                action_statement = context.body_statements[context.current_index]
-                context.current_index += 1
-                result = self.execute_statement(action_statement)
-                if result is not None:
-                    self.context_stack.pop()
-                    return result
-            
-            self.context_stack.pop()
+        return match.group(1), tuple(body_tokens)
+
+    # contexts are kept per body and handed out again once the loop or ritual using them is done,
+    # so a nested loop does not allocate one per outer iteration; recursion just gets a fresh one
+    def take_context(self, body_statements):
+        context = self.spare_contexts.pop(id(body_statements), None)
+        if context is None or context.body_statements is not body_statements:
+            context = ExecutionContext(source='body', body_statements=body_statements, start_index=0)
+        context.current_index = 0
+        self.push_context(context)
+        return context
+
+    def release_context(self, context):
+        self.context_stack.pop()
+        self.spare_contexts[id(context.body_statements)] = context
+
+    def run_body(self, context):
+        context.current_index = 0
+        body_statements = context.body_statements
+        while context.current_index < len(body_statements):
+            statement = body_statements[context.current_index]
+            context.current_index += 1
+            result = self.execute_statement(statement)
+            if result is not None:
+                return result
+        return None
 
     def parse_number(self, text):
         text = text.strip()
@@ -708,6 +1361,19 @@ class SpellScriptInterpreter:
             inner = condition[4:].strip()
             return not self.evaluate_condition(inner)
 
+        if " dwells within " in cond_lower:
+            parts = re.split(r'\s+dwells within\s+', condition, flags=re.IGNORECASE, maxsplit=1)
+            a, array_name = parts[0].strip(), parts[1].strip()
+            if array_name not in self.variables:
+                raise NameError(f"unknown entity {array_name}")
+            array = self.variables[array_name]
+            if not isinstance(array, (list, dict, CollectionView)):
+                raise TypeError(f"{array_name} is not a collection")
+            try:
+                return self.evaluate_expression(a) in array
+            except TypeError:
+                return False
+
         if " equals " in cond_lower:
             parts = re.split(r'\s+equals\s+', condition, flags=re.IGNORECASE, maxsplit=1)
             a, b = parts[0].strip(), parts[1].strip()
@@ -733,17 +1399,47 @@ class SpellScriptInterpreter:
         return False
 
     def evaluate_expression(self, expr):
+        self.counters["expressions"] += 1
         expr = expr.strip()
-        
-        if "collection holding" in expr.lower():
+
+        # every keyword below contains a space, and the prefix checks only apply for their first word
+        space = expr.find(" ")
+        if space == -1:
+            return self.evaluate_atom(expr)
+        lower = expr.lower()
+        first = lower[:space]
+
+        if first in ("empty", "tome"):
+            if lower == "empty tome":
+                self.counters["collections_allocated"] += 1
+                return {}
+
+            if lower.startswith("tome holding "):
+                items = self.split_collection_items(expr[len("tome holding "):].strip())
+                self.counters["collections_allocated"] += 1
+                tome = {}
+                for item in items:
+                    entry = re.split(r'\s+bearing\s+', item, flags=re.IGNORECASE, maxsplit=1)
+                    if len(entry) != 2:
+                        raise SyntaxError("use tome holding <key> bearing <value> and <key> bearing <value>")
+                    key = self.evaluate_expression(entry[0].strip())
+                    value = self.evaluate_expression(entry[1].strip())
+                    try:
+                        tome[key] = value
+                    except TypeError:
+                        raise TypeError("tome keys must be numbers, text or truths")
+                return tome
+
+        if "collection holding" in lower:
             pattern = r'collection holding (.+)'
             match = re.search(pattern, expr, re.IGNORECASE)
             if match:
                 items_str = match.group(1).strip()
                 items = self.split_collection_items(items_str)
+                self.counters["collections_allocated"] += 1
                 return [self.evaluate_expression(item.strip()) for item in items]
         
-        if " bound with " in expr.lower():
+        if " bound with " in lower:
             parts = re.split(r'\s+bound with\s+', expr, flags=re.IGNORECASE)
             result = ""
             for part in parts:
@@ -751,7 +1447,7 @@ class SpellScriptInterpreter:
                 result += str(val)
             return result
         
-        if " at position " in expr.lower():
+        if " at position " in lower:
             pattern = r'(\w+)\s+at position\s+(.+)'
             match = re.match(pattern, expr, re.IGNORECASE)
             if match:
@@ -762,7 +1458,13 @@ class SpellScriptInterpreter:
                     raise NameError(f"unknown entity {array_name}")
 
                 array = self.variables[array_name]
-                if not isinstance(array, list):
+                if isinstance(array, dict):
+                    key = self.evaluate_expression(index_expr)
+                    try:
+                        return array[key]
+                    except (KeyError, TypeError):
+                        raise LookupError(f"key {key} not found in {array_name}")
+                if not isinstance(array, (list, CollectionView)):
                     raise TypeError(f"{array_name} is not a collection")
 
                 index = self.evaluate_expression(index_expr)
@@ -774,19 +1476,85 @@ class SpellScriptInterpreter:
 
                 return array[index]
         
-        if expr.lower().startswith("length of "):
-            array_name = expr[len("length of "):].strip()
+        if first in ("length", "portion", "sorted", "position", "divine"):
+            if lower.startswith("length of "):
+                array_name = expr[len("length of "):].strip()
             
-            if array_name not in self.variables:
-                raise NameError(f"unknown entity {array_name}")
+                if array_name not in self.variables:
+                    raise NameError(f"unknown entity {array_name}")
             
-            array = self.variables[array_name]
-            if not isinstance(array, list):
-                raise TypeError(f"{array_name} is not a collection")
+                array = self.variables[array_name]
+                if not isinstance(array, (list, dict, CollectionView)):
+                    raise TypeError(f"{array_name} is not a collection")
             
-            return len(array)
-        
-        if "through ritual" in expr.lower():
+                return len(array)
+
+            if lower.startswith("portion of "):
+                match = re.match(r'portion of\s+(\w+)\s+from\s+(.+?)\s+to\s+(.+)$', expr, re.IGNORECASE)
+                if match:
+                    array_name, start_expr, stop_expr = match.groups()
+                    if array_name not in self.variables:
+                        raise NameError(f"unknown entity {array_name}")
+                    array = self.variables[array_name]
+                    if not isinstance(array, (list, CollectionView)):
+                        raise TypeError(f"{array_name} is not a collection")
+                    start = self.evaluate_expression(start_expr)
+                    stop = self.evaluate_expression(stop_expr)
+                    if not isinstance(start, int) or not isinstance(stop, int):
+                        raise TypeError("portion bounds must be numbers")
+                    if start < 0 or stop < start or stop > len(array):
+                        raise IndexError(f"portion {start} to {stop} out of range for collection of length {len(array)}")
+                    self.counters["views_created"] += 1
+                    if isinstance(array, CollectionView):
+                        return CollectionView(array.source, array.start + start, array.start + stop)
+                    return CollectionView(array, start, stop)
+
+            if lower.startswith("sorted "):
+                match = re.match(r'sorted\s+(\w+)(?:\s+by ritual\s+(\w+))?$', expr, re.IGNORECASE)
+                if match:
+                    array_name, ritual_name = match.groups()
+                    if array_name not in self.variables:
+                        raise NameError(f"unknown entity {array_name}")
+                    array = self.variables[array_name]
+                    if not isinstance(array, (list, dict, CollectionView)):
+                        raise TypeError(f"{array_name} is not a collection")
+                    values = list(array)
+                    self.sort_values(values, array_name, ritual_name)
+                    self.counters["collections_allocated"] += 1
+                    return values
+
+            if lower.startswith("position of ") or lower.startswith("divine "):
+                match = re.match(r'(position of|divine)\s+(.+)\s+within\s+(\w+)$', expr, re.IGNORECASE)
+                if match:
+                    mode, value_expr, array_name = match.groups()
+                    if array_name not in self.variables:
+                        raise NameError(f"unknown entity {array_name}")
+                    array = self.variables[array_name]
+                    if isinstance(array, CollectionView):
+                        source, lo, hi = array.source, array.start, array.stop
+                    elif isinstance(array, list):
+                        source, lo, hi = array, 0, len(array)
+                    else:
+                        raise TypeError(f"{array_name} is not a collection")
+                    value = self.evaluate_expression(value_expr)
+                    if mode.lower() == "divine":
+                        try:
+                            index = bisect.bisect_left(source, value, lo, hi)
+                        except TypeError as e:
+                            raise TypeError(f"cannot divine within {array_name}: {e}")
+                        if index < hi and source[index] == value:
+                            return index - lo
+                        return -1
+                    try:
+                        return source.index(value, lo, hi) - lo
+                    except ValueError:
+                        return -1
+
+        if "through ritual" in lower:
+            # the checks above look only at the text, so a call found once can skip its parsing
+            call_site = self.resolved_calls.get(expr)
+            if call_site is not None:
+                return self.call_resolved(*call_site)
             pattern = r'through ritual\s+(\w+)(?:\s+with\s+(.+?))?(?=\s+and\s+through|$)'
             match = re.search(pattern, expr, re.IGNORECASE)
             if match:
@@ -795,9 +1563,11 @@ class SpellScriptInterpreter:
                 ritual_call = name
                 if args:
                     ritual_call += " with " + args
-                return self.evaluate_ritual_call(ritual_call)
+                call_site = self.parse_ritual_call(ritual_call)
+                self.resolved_calls[expr] = call_site
+                return self.call_resolved(*call_site)
 
-        if "invoke the ritual" in expr.lower():
+        if "invoke the ritual" in lower:
             pattern = r'invoke the ritual (\w+)(?: with (.+))?'
             match = re.search(pattern, expr, re.IGNORECASE)
             if match:
@@ -814,55 +1584,17 @@ class SpellScriptInterpreter:
 
                 return result
         
-        if "multiplied by" in expr.lower():
-            parts = re.split(r'\s+multiplied by\s+', expr, flags=re.IGNORECASE, maxsplit=1)
-            if len(parts) == 2:
-                a = self.evaluate_expression(parts[0].strip())
-                b = self.evaluate_expression(parts[1].strip())
-                if not isinstance(a, (int, float)):
-                    raise TypeError(f"Expected number, got {type(a).__name__}: {a}")
-                if not isinstance(b, (int, float)):
-                    raise TypeError(f"Expected number, got {type(b).__name__}: {b}")
-                return a * b
-
-        if "divided by" in expr.lower():
-            parts = re.split(r'\s+divided by\s+', expr, flags=re.IGNORECASE, maxsplit=1)
-            if len(parts) == 2:
-                a = self.evaluate_expression(parts[0].strip())
-                b = self.evaluate_expression(parts[1].strip())
-                if not isinstance(a, (int, float)):
-                    raise TypeError(f"Expected number, got {type(a).__name__}: {a}")
-                if not isinstance(b, (int, float)):
-                    raise TypeError(f"Expected number, got {type(b).__name__}: {b}")
-                if b == 0:
-                    raise ZeroDivisionError("Cannot divide by zero")
-                result = a / b
-                if isinstance(a, int) and isinstance(b, int) and result.is_integer():
-                    return int(result)
-                return result
-        
-        if "greater by" in expr.lower():
-            parts = re.split(r'\s+greater by\s+', expr, flags=re.IGNORECASE, maxsplit=1)
-            if len(parts) == 2:
-                a = self.evaluate_expression(parts[0].strip())
-                b = self.evaluate_expression(parts[1].strip())
-                if not isinstance(a, (int, float)):
-                    raise TypeError(f"Expected number, got {type(a).__name__}: {a}")
-                if not isinstance(b, (int, float)):
-                    raise TypeError(f"Expected number, got {type(b).__name__}: {b}")
-                return a + b
-        
-        if "lesser by" in expr.lower():
-            parts = re.split(r'\s+lesser by\s+', expr, flags=re.IGNORECASE, maxsplit=1)
-            if len(parts) == 2:
-                a = self.evaluate_expression(parts[0].strip())
-                b = self.evaluate_expression(parts[1].strip())
-                if not isinstance(a, (int, float)):
-                    raise TypeError(f"Expected number, got {type(a).__name__}: {a}")
-                if not isinstance(b, (int, float)):
-                    raise TypeError(f"Expected number, got {type(a).__name__}: {b}")
-                return a - b
+        for op in ARITHMETIC_OPERATORS:
+            if op in lower:
+                parts = OPERATOR_SPLITTERS[op].split(expr, maxsplit=1)
+                if len(parts) == 2:
+                    a = self.evaluate_expression(parts[0].strip())
+                    b = self.evaluate_expression(parts[1].strip())
+                    return apply_operator(op, a, b)
 
+        return self.evaluate_atom(expr)
+
+    def evaluate_atom(self, expr):
         if expr in self.variables:
             return self.variables[expr]
         
@@ -871,9 +1603,10 @@ class SpellScriptInterpreter:
         except ValueError:
             pass
         
-        if expr.lower() == "truth":
+        lower = expr.lower()
+        if lower == "truth":
             return True
-        if expr.lower() == "falsehood":
+        if lower == "falsehood":
             return False
         
         if expr.startswith('whispers of "') and expr.endswith('"'):
@@ -881,18 +1614,434 @@ class SpellScriptInterpreter:
         
         return expr
 
+grimoire_cache = {}
+grimoires_loading = set()
+# (path, mtime) stamps collected by each grimoire being loaded, innermost last
+grimoire_stamps = []
+
+def grimoire_is_fresh(stamps):
+    for path, mtime in stamps:
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+def load_grimoire(path):
+    path = os.path.abspath(path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        raise FileNotFoundError(f"grimoire {path} not found")
+    entry = grimoire_cache.get(path)
+    if entry is not None and grimoire_is_fresh(entry[0]):
+        stamps, rituals = entry
+    else:
+        stamps, rituals = read_grimoire(path, mtime)
+        grimoire_cache[path] = (stamps, rituals)
+    if grimoire_stamps:
+        grimoire_stamps[-1].update(stamps)
+    return rituals
+
+# the stamps cover the grimoire and every grimoire it consults, so a change to any of them reloads it
+def read_grimoire(path, mtime):
+    if path in grimoires_loading:
+        raise SyntaxError(f"grimoire {path} consults itself")
+
+    with open(path, 'r') as f:
+        text = f.read()
+    loader = SpellScriptInterpreter()
+    loader.spell_dir = os.path.dirname(path)
+    loader.tokens = loader.tokenize(text)
+    if not loader.tokens or "begin the grimoire" not in loader.tokens[0].lower() \
+            or "close the grimoire" not in loader.tokens[-1].lower():
+        raise SyntaxError(f"grimoire {path} must begin and close like a spell")
+
+    stamps = {(path, mtime)}
+    grimoires_loading.add(path)
+    grimoire_stamps.append(stamps)
+    try:
+        loader.current_token_index = 1
+        while loader.current_token_index < len(loader.tokens) - 1:
+            statement = loader.tokens[loader.current_token_index]
+            loader.current_token_index += 1
+            cmd = statement.split()[0].lower()
+            if cmd not in ("conjure", "consult"):
+                raise SyntaxError(f"grimoire {path} may only conjure rituals and consult grimoires")
+            loader.execute_statement(statement)
+    finally:
+        grimoires_loading.discard(path)
+        grimoire_stamps.pop()
+
+    rituals = {}
+    for library in loader.libraries:
+        for name, func in library.items():
+            rituals.setdefault(name, func)
+    for name, func in loader.functions.items():
+        rituals[name] = dict(func, params=tuple(func["params"]), body=tuple(func["body"]))
+    return frozenset(stamps), rituals
+
+parallel_worker = None
+
+def make_traverse_worker(variables, functions, body_statements, item_var, index_var, local_names, result_names):
+    interp = SpellScriptInterpreter()
+    interp.variables = variables
+    interp.functions = functions
+    return (interp, body_statements, item_var, index_var, local_names, result_names)
+
+def init_parallel_worker(*worker_args):
+    global parallel_worker
+    parallel_worker = make_traverse_worker(*worker_args)
+
+def run_parallel_chunk(chunk):
+    return run_worker_chunk(parallel_worker, chunk)
+
+def run_worker_chunk(worker, chunk):
+    interp, body_statements, item_var, index_var, local_names, result_names = worker
+    start, items = chunk
+    interp.counters = new_counters()
+    element_results, error = run_traverse_chunk(interp, body_statements, item_var, index_var,
+                                                local_names, result_names, start, items)
+    return element_results, error, interp.counters
+
+def run_traverse_chunk(interp, body_statements, item_var, index_var, local_names, result_names, start, items):
+    saved_results = {name: interp.variables.get(name) for name in result_names}
+    element_results = []
+    error = None
+    context = ExecutionContext(source='body', body_statements=body_statements, start_index=0)
+    interp.push_context(context)
+    for idx, item in enumerate(items, start):
+        interp.counters["loop_iterations"] += 1
+        for name in local_names:
+            interp.variables.pop(name, None)
+        for name in result_names:
+            interp.variables[name] = []
+        interp.variables[item_var] = item
+        if index_var:
+            interp.variables[index_var] = idx
+
+        try:
+            interp.run_body(context)
+        except Exception as e:
+            error = e
+
+        appended = {name: interp.variables[name] for name in result_names if interp.variables.get(name)}
+        written = {name: interp.variables[name] for name in local_names if name in interp.variables}
+        element_results.append((appended, written))
+        if error is not None:
+            break
+    interp.context_stack.pop()
+    for name, value in saved_results.items():
+        interp.variables[name] = value
+    return element_results, error
+
+def cast_spell(spell_text, inputs=(), spell_dir=None):
+    interp = SpellScriptInterpreter()
+    interp.spell_dir = spell_dir
+    output = io.StringIO()
+    saved_stdin = sys.stdin
+    sys.stdin = io.StringIO("".join(f"{line}\n" for line in inputs))
+    status, error = 0, None
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            interp.parse_and_execute(spell_text)
+    except Exception as e:
+        status, error = 1, str(e)
+        output.write(f"the spell has backfired: {e}\n")
+    finally:
+        sys.stdin = saved_stdin
+    return {
+        "output": output.getvalue(),
+        "status": status,
+        "error": error,
+        "elapsed": time.perf_counter() - start,
+        "stats": interp.stats(),
+    }
+
+def warm_spell_worker():
+    cast_spell("begin the grimoire. summon the x with essence of 1. close the grimoire.")
+
+def spell_worker_loop(conn):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    warm_spell_worker()
+    while True:
+        try:
+            spell_text, inputs, spell_dir = conn.recv()
+        except EOFError:
+            return
+        conn.send(cast_spell(spell_text, inputs, spell_dir))
+
+class SpellWorker:
+    # spawned rather than forked, so a worker started while clients are connected
+    # does not inherit the listening socket or their connections
+    process_context = multiprocessing.get_context("spawn")
+
+    def __init__(self):
+        self.conn, child_conn = self.process_context.Pipe()
+        self.process = self.process_context.Process(target=spell_worker_loop, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def cast(self, spell_text, inputs, spell_dir, timeout):
+        self.conn.send((spell_text, inputs, spell_dir))
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"the spell did not finish within {timeout:g}s")
+        return self.conn.recv()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+class SpellService:
+    def __init__(self, workers, queue_size, timeout=DEFAULT_SPELL_TIMEOUT):
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.idle = queue.Queue()
+        self.workers = set()
+        self.lock = threading.Lock()
+        self.closed = False
+        for _ in range(workers):
+            worker = SpellWorker()
+            self.workers.add(worker)
+            self.idle.put(worker)
+
+    def replace(self, worker):
+        worker.kill()
+        with self.lock:
+            self.workers.discard(worker)
+            if self.closed:
+                return None
+            worker = SpellWorker()
+            self.workers.add(worker)
+        return worker
+
+    def handle_line(self, line):
+        received = time.perf_counter()
+        try:
+            request = json.loads(line)
+            spell_text = request["spell"]
+            inputs = request.get("inputs", [])
+            spell_dir = request.get("spell_dir")
+            if not isinstance(spell_text, str) or not isinstance(inputs, list):
+                raise TypeError("spell must be text and inputs a list")
+            if spell_dir is not None and not isinstance(spell_dir, str):
+                raise TypeError("spell_dir must be text")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return {"output": "", "status": 2, "error": f"bad request: {e}"}
+
+        if not self.slots.acquire(blocking=False):
+            return {"output": "", "status": 2, "error": "server busy, try again later"}
+        try:
+            worker = self.idle.get()
+            if not worker.process.is_alive():
+                worker = self.replace(worker)
+                if worker is None:
+                    return {"output": "", "status": 2, "error": "server is shutting down"}
+            try:
+                result = worker.cast(spell_text, [str(i) for i in inputs], spell_dir, self.timeout)
+            except (TimeoutError, EOFError, OSError) as e:
+                # a stuck or dead worker is thrown away so its slot is not lost
+                worker = self.replace(worker)
+                if isinstance(e, TimeoutError):
+                    error = str(e)
+                else:
+                    error = "the worker running the spell died"
+                result = {"output": "", "status": 2, "error": error}
+            if worker is not None:
+                self.idle.put(worker)
+        finally:
+            self.slots.release()
+        result["total_elapsed"] = time.perf_counter() - received
+        return result
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            workers = list(self.workers)
+        for worker in workers:
+            worker.kill()
+
+class SpellRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.spell_service.handle_line(line)
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+class SpellTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+class SpellUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def parse_address(text):
+    host, sep, port = text.rpartition(":")
+    if sep and port.isdigit() and "/" not in text:
+        return (host or "127.0.0.1", int(port))
+    return text
+
+def serve(address, workers, queue_size, timeout=DEFAULT_SPELL_TIMEOUT):
+    service = SpellService(workers, queue_size, timeout)
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.unlink(address)
+        server = SpellUnixServer(address, SpellRequestHandler)
+    else:
+        server = SpellTCPServer(address, SpellRequestHandler)
+    server.spell_service = service
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"serving spells on {address} with {workers} workers", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+
+def cast_remote(spell_text, inputs=(), address=("127.0.0.1", DEFAULT_SERVE_PORT), spell_dir=None):
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as conn:
+        conn.connect(address)
+        request = {"spell": spell_text, "inputs": list(inputs)}
+        if spell_dir is not None:
+            request["spell_dir"] = spell_dir
+        conn.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with conn.makefile("r", encoding="utf-8") as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("the spell server closed the connection")
+    return json.loads(line)
+
+def format_stats(stats):
+    lines = ["spell statistics:"]
+    for key, value in stats.items():
+        if key == "ritual_calls":
+            lines.append("  ritual calls:")
+            for name, calls in sorted(value.items()):
+                lines.append(f"    {name}: {calls}")
+        else:
+            lines.append(f"  {key.replace('_', ' ')}: {value}")
+    return "\n".join(lines)
+
+def format_bytes(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+def format_memory_report(report):
+    lines = ["memory report:", f"  peak traced memory: {format_bytes(report['peak_bytes'])}", "  variables (size now / largest seen):"]
+    for entry in report["variables"]:
+        lines.append(f"    {entry['name']:<20} {entry['type']:<10} {format_bytes(entry['bytes']):>12} {format_bytes(entry['peak_bytes']):>12}")
+    lines.append("  growth by statement or ritual (growth / absolute peak):")
+    for entry in report["peaks"]:
+        lines.append(f"    {entry['where']:<50} {format_bytes(entry['growth_bytes']):>12} {format_bytes(entry['peak_bytes']):>12}")
+    return "\n".join(lines)
+
+def report_memory(interp, memory_format, top):
+    if not memory_format:
+        return
+    interp.memory_tracker.finish()
+    report = interp.memory_report(top)
+    if memory_format == "json":
+        print(json.dumps(report), file=sys.stderr)
+    else:
+        print(format_memory_report(report), file=sys.stderr)
+
+def report_stats(interp, stats_format):
+    if stats_format == "json":
+        print(json.dumps(interp.stats()), file=sys.stderr)
+    elif stats_format:
+        print(format_stats(interp.stats()), file=sys.stderr)
+
 def main():
-    if len(sys.argv) < 2:
-        print("usage: python spellscript.py <filename>.spell")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = {}
+    for option in sys.argv[1:]:
+        if option.startswith("--"):
+            name, _, value = option[2:].partition("=")
+            options[name] = value
+    unknown = set(options) - {"stats", "serve", "socket", "port", "workers", "queue", "remote", "no-inline",
+                              "memory-report", "top", "timeout", "inputs"}
+    if unknown:
+        print(f"unknown option --{sorted(unknown)[0]}")
+        sys.exit(1)
+
+    if "serve" in options:
+        workers = int(options.get("workers") or os.cpu_count() or 1)
+        queue_size = int(options.get("queue") or workers * 4)
+        if options.get("socket"):
+            address = options["socket"]
+        else:
+            address = ("127.0.0.1", int(options.get("port") or DEFAULT_SERVE_PORT))
+        timeout = float(options.get("timeout") or DEFAULT_SPELL_TIMEOUT)
+        serve(address, workers, queue_size, timeout)
+        return
+
+    if not args:
+        print("usage: python spellscript.py <filename>.spell [--stats[=json]] [--memory-report[=json]] [--top=<n>]")
+        print("                                             [--no-inline] [--remote=<address> [--inputs=<file>]]")
+        print("       python spellscript.py --serve [--port=<n> | --socket=<path>] [--workers=<n>] [--queue=<n>]")
+        print("                                [--timeout=<seconds>]")
         sys.exit(1)
-    with open(sys.argv[1], 'r') as f:
+    stats_format = None
+    if "stats" in options:
+        stats_format = "json" if options["stats"] == "json" else "text"
+    with open(args[0], 'r') as f:
         text = f.read()
+
+    if "remote" in options:
+        inputs = []
+        if options.get("inputs") == "-":
+            inputs = sys.stdin.read().splitlines()
+        elif options.get("inputs"):
+            with open(options["inputs"], 'r') as f:
+                inputs = f.read().splitlines()
+        try:
+            result = cast_remote(text, inputs, parse_address(options["remote"] or f"127.0.0.1:{DEFAULT_SERVE_PORT}"),
+                                 os.path.dirname(os.path.abspath(args[0])))
+        except OSError as e:
+            print(f"could not reach the spell server: {e}")
+            sys.exit(2)
+        sys.stdout.write(result["output"])
+        if result["status"] == 2:
+            print(f"the spell server refused: {result['error']}")
+        if stats_format == "json":
+            print(json.dumps(result.get("stats", {})), file=sys.stderr)
+        elif stats_format and "stats" in result:
+            print(format_stats(result["stats"]), file=sys.stderr)
+        sys.exit(result["status"])
+
     interp = SpellScriptInterpreter()
+    interp.spell_dir = os.path.dirname(os.path.abspath(args[0]))
+    interp.inline_rituals = "no-inline" not in options
+    memory_format = None
+    if "memory-report" in options:
+        memory_format = "json" if options["memory-report"] == "json" else "text"
+        interp.memory_tracker = MemoryTracker()
+        interp.memory_tracker.start()
+    top = int(options.get("top") or 10)
     try:
         interp.parse_and_execute(text)
     except Exception as e:
         print(f"the spell has backfired: {e}")
+        report_stats(interp, stats_format)
+        report_memory(interp, memory_format, top)
         sys.exit(1)
+    report_stats(interp, stats_format)
+    report_memory(interp, memory_format, top)
 
 if __name__ == "__main__":
     main()